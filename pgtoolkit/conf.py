@@ -42,15 +42,14 @@ You can use this module to dump a configuration file as JSON object
 from __future__ import annotations
 
 import contextlib
-import copy
 import enum
+import functools
 import json
 import pathlib
 import re
+import stat
 import sys
-from collections import OrderedDict
 from collections.abc import Iterable, Iterator
-from dataclasses import dataclass, field
 from datetime import timedelta
 from typing import IO, Any, NoReturn, Union
 from warnings import warn
@@ -73,7 +72,13 @@ class IncludeType(enum.Enum):
     include = enum.auto()
 
 
-def parse(fo: str | pathlib.Path | IO[str]) -> Configuration:
+_INCLUDE_NAMES = frozenset(IncludeType.__members__)
+_INCLUDE_BY_NAME = {n: IncludeType[n] for n in _INCLUDE_NAMES}
+
+
+def parse(
+    fo: str | pathlib.Path | IO[str], *, keep_lines: bool = True
+) -> Configuration:
     """Parse a configuration file.
 
     The parser tries to return Python object corresponding to value, based on
@@ -91,19 +96,33 @@ def parse(fo: str | pathlib.Path | IO[str]) -> Configuration:
     RuntimeError is raised.
 
     :param fo: A line iterator such as a file-like object or a path.
+    :param keep_lines: Whether to keep raw lines in the returned
+        :class:`Configuration`, allowing to :meth:`Configuration.save` it
+        while preserving comments and formatting. Disable to save memory on
+        read-only usage; :meth:`Configuration.save` then refuses to write,
+        as the original content would be lost.
     :returns: A :class:`Configuration` containing parsed configuration.
 
     """
     with open_or_return(fo) as f:
         conf = Configuration(getattr(f, "name", None))
-        list(_consume(conf, f))
+        read = getattr(f, "read", None)
+        if read is not None:
+            # Slurping the file and splitting at C level is faster than
+            # going through buffered readline for each line.
+            content: Iterable[str] = read().splitlines(keepends=True)
+        else:
+            content = f
+        _consume(conf, content, keep_lines=keep_lines)
 
     return conf
 
 
-def _consume(conf: Configuration, content: Iterable[str]) -> Iterator[None]:
-    for include_path, include_type in conf.parse(content):
-        yield from parse_include(conf, include_path, include_type)
+def _consume(
+    conf: Configuration, content: Iterable[str], *, keep_lines: bool = True
+) -> None:
+    for include_path, include_type in conf.parse(content, keep_lines=keep_lines):
+        parse_include(conf, include_path, include_type)
 
 
 def parse_string(string: str, source: str | None = None) -> Configuration:
@@ -125,8 +144,9 @@ def parse_include(
     path: pathlib.Path,
     include_type: IncludeType,
     *,
-    _processed: set[pathlib.Path] | None = None,
-) -> Iterator[None]:
+    _processed: set[str] | None = None,
+    _relative_to: pathlib.Path | None = None,
+) -> None:
     """Parse on include directive with 'path' value of type 'include_type' into
     'conf' object.
     """
@@ -148,48 +168,68 @@ def parse_include(
             raise ParseError(
                 "cannot process include directives referencing a relative path"
             )
-        relative_to = pathlib.Path(conf.path).absolute()
-        assert relative_to.is_absolute()
-        if relative_to.is_file():
-            relative_to = relative_to.parent
-        path = relative_to / path
+        if _relative_to is None:
+            # Resolve the base directory only once per configuration file;
+            # recursive calls below reuse it.
+            _relative_to = pathlib.Path(conf.path).absolute()
+            assert _relative_to.is_absolute()
+            if _relative_to.is_file():
+                _relative_to = _relative_to.parent
+        path = _relative_to / path
 
     if include_type == IncludeType.include_dir:
-        if not path.exists() or not path.is_dir():
+        try:
+            is_dir = stat.S_ISDIR(path.stat().st_mode)
+        except OSError:
+            is_dir = False
+        if not is_dir:
             raise notfound(path, "directory", conf.path)
         for confpath in sorted(path.glob("*.conf")):
             if not confpath.name.startswith("."):
-                yield from parse_include(
+                parse_include(
                     conf,
                     confpath,
                     IncludeType.include,
                     _processed=_processed,
+                    _relative_to=_relative_to,
                 )
 
     elif include_type == IncludeType.include_if_exists:
         if path.exists():
-            yield from parse_include(
-                conf, path, IncludeType.include, _processed=_processed
+            parse_include(
+                conf,
+                path,
+                IncludeType.include,
+                _processed=_processed,
+                _relative_to=_relative_to,
             )
 
     elif include_type == IncludeType.include:
         if not path.exists():
             raise notfound(path, "file", conf.path)
 
-        if path in _processed:
+        # Keyed by string, as hashing a str is much cheaper than hashing a
+        # pathlib.Path.
+        key = str(path)
+        if key in _processed:
             raise RuntimeError(f"loop detected in include directive about '{path}'")
-        _processed.add(path)
+        _processed.add(key)
 
         subconf = Configuration(path=str(path))
         with path.open() as f:
             for sub_include_path, sub_include_type in subconf.parse(f):
-                yield from parse_include(
+                parse_include(
                     subconf,
                     sub_include_path,
                     sub_include_type,
                     _processed=_processed,
                 )
         conf.entries.update(subconf.entries)
+        for k, e in subconf.entries.items():
+            if e.commented:
+                conf._active.pop(k, None)
+            else:
+                conf._active[k] = e
 
     else:
         assert False, include_type  # pragma: nocover
@@ -201,7 +241,6 @@ MEMORY_MULTIPLIERS = {
     "GB": 1024 * 1024 * 1024,
     "TB": 1024 * 1024 * 1024 * 1024,
 }
-_memory_re = re.compile(r"^\s*(?P<number>\d+)\s*(?P<unit>[kMGT]B)\s*$")
 TIMEDELTA_ARGNAME = {
     "ms": "milliseconds",
     "s": "seconds",
@@ -209,25 +248,43 @@ TIMEDELTA_ARGNAME = {
     "h": "hours",
     "d": "days",
 }
-_timedelta_re = re.compile(r"^\s*(?P<number>\d+)\s*(?P<unit>ms|s|min|h|d)\s*$")
+# Memory and timedelta values share a '<number> <unit>' shape; recognize both
+# with a single alternation and branch on which named group matched.
+_unit_re = re.compile(
+    r"^\s*(?P<number>\d+)\s*(?:(?P<mem>[kMGT]B)|(?P<td>ms|s|min|h|d))\s*$"
+)
+_UNIT_MATCH = _unit_re.match
+
+_parameter_re = re.compile(
+    r"^(?P<name>[a-z_.]+)(?: +(?!=)| *= *)(?P<value>.*?)"
+    "[\\s\t]*"
+    r"(?P<comment>#.*)?$"
+)
+_PARAM_MATCH = _parameter_re.match
 
 _minute = 60
 _hour = 60 * _minute
 _day = 24 * _hour
-_timedelta_unit_map = [
-    ("d", _day),
-    ("h", _hour),
-    # The space before 'min' is intentionnal. I find '1 min' more readable
-    # than '1min'.
-    (" min", _minute),
-    ("s", 1),
-]
+
+
+_BOOL_TRUE_SET = frozenset(("true", "yes", "on"))
+_BOOL_FALSE_SET = frozenset(("false", "no", "off"))
+_OCTAL_DIGITS = frozenset("01234567")
 
 
 Value = Union[str, bool, float, int, timedelta]
 
 
 def parse_value(raw: str) -> Value:
+    return _parse_value_cached(raw)
+
+
+@functools.lru_cache(maxsize=2048)
+def _parse_value_cached(raw: str) -> Value:
+    # Caching is safe as every possible return type is immutable, including
+    # timedelta. Real configuration files repeat a lot of tokens ('on',
+    # 'off', '5432', '1GB', ...), so repeat calls become a dict lookup.
+    #
     # Ref.
     # https://www.postgresql.org/docs/current/static/config-setting.html#CONFIG-SETTING-NAMES-VALUES
 
@@ -235,34 +292,39 @@ def parse_value(raw: str) -> Value:
     if raw.startswith("'"):
         if not raw.endswith("'"):
             raise ValueError(raw)
-        # unquote value and unescape quotes
-        raw = raw[1:-1].replace("''", "'").replace(r"\'", "'")
+        # unquote value and unescape quotes, if any
+        inner = raw[1:-1]
+        if "'" in inner:
+            inner = inner.replace("''", "'").replace(r"\'", "'")
+        raw = inner
         quoted = True
 
-    if raw.startswith("0") and raw != "0":
-        try:
-            int(raw, base=8)
-            return raw
-        except ValueError:
-            pass
-
-    m = _memory_re.match(raw)
-    if m:
-        return raw.strip()
-
-    m = _timedelta_re.match(raw)
-    if m:
-        unit = m.group("unit")
-        arg = TIMEDELTA_ARGNAME[unit]
-        kwargs = {arg: int(m.group("number"))}
-        return timedelta(**kwargs)
+    # Octal literals (e.g. unix_socket_permissions) are kept as strings;
+    # trailing whitespace is tolerated, as with int(raw, base=8) before.
+    if raw.startswith("0") and raw != "0" and set(raw.rstrip()) <= _OCTAL_DIGITS:
+        return raw
 
-    if raw in ("true", "yes", "on"):
+    if raw in _BOOL_TRUE_SET:
         return True
 
-    if raw in ("false", "no", "off"):
+    if raw in _BOOL_FALSE_SET:
         return False
 
+    # Cheap suffix dispatch: memory and timedelta values end with a known
+    # unit letter, so the regex is skipped altogether for plain ints,
+    # floats and strings. Values padded with whitespace still go through
+    # the regex, as before.
+    last = raw[-1:]
+    fuzzy = bool(last) and last.isspace()
+    if fuzzy or (last == "B" and raw[-2:-1] in "kMGT") or last in "sndh":
+        m = _UNIT_MATCH(raw)
+        if m:
+            if m.lastgroup == "mem":
+                return raw.strip()
+            arg = TIMEDELTA_ARGNAME[m.group("td")]
+            kwargs = {arg: int(m.group("number"))}
+            return timedelta(**kwargs)
+
     if not quoted:
         try:
             return int(raw)
@@ -282,22 +344,30 @@ def serialize_value(value: Value) -> str:
     elif isinstance(value, str):
         # Only quote if not already quoted.
         if not (value.startswith("'") and value.endswith("'")):
-            # Only double quotes, if not already done; we assume this is
-            # done everywhere in the string or nowhere.
-            if "''" not in value and r"\'" not in value:
+            # Only double quotes, if any and not already done; we assume
+            # this is done everywhere in the string or nowhere.
+            if "'" in value and "''" not in value and r"\'" not in value:
                 value = value.replace("'", "''")
-            value = "'%s'" % value
+            value = f"'{value}'"
     elif isinstance(value, timedelta):
         seconds = value.days * _day + value.seconds
         if value.microseconds:
             unit = " ms"
             value = seconds * 1000 + value.microseconds // 1000
+        elif seconds % _day == 0:
+            unit = "d"
+            value = seconds // _day
+        elif seconds % _hour == 0:
+            unit = "h"
+            value = seconds // _hour
+        elif seconds % _minute == 0:
+            # The space before 'min' is intentionnal. I find '1 min' more
+            # readable than '1min'.
+            unit = " min"
+            value = seconds // _minute
         else:
-            for unit, mod in _timedelta_unit_map:
-                if seconds % mod:
-                    continue
-                value = seconds // mod
-                break
+            unit = "s"
+            value = seconds
         value = f"'{value}{unit}'"
     else:
         value = str(value)
@@ -307,25 +377,58 @@ def serialize_value(value: Value) -> str:
 _unspecified: Any = object()
 
 
-@dataclass
 class Entry:
     """Configuration entry, parsed from a line in the configuration file."""
 
+    # Slots avoid a per-instance __dict__, which adds up on large
+    # configuration trees.
+    __slots__ = ("name", "_value", "commented", "comment", "raw_line")
+
     name: str
     _value: Value
-    # _: KW_ONLY from Python 3.10
-    commented: bool = False
-    comment: str | None = None
-    raw_line: str = field(default=_unspecified, compare=False, repr=False)
+    commented: bool
+    comment: str | None
+    raw_line: str
 
-    def __post_init__(self) -> None:
-        if self.raw_line is _unspecified:
+    def __init__(
+        self,
+        name: str,
+        _value: Value,
+        commented: bool = False,
+        comment: str | None = None,
+        raw_line: str = _unspecified,
+    ) -> None:
+        # Parameter names repeat a lot across included files; interning
+        # de-duplicates the strings and speeds up dict lookups by name.
+        self.name = sys.intern(name)
+        self._value = _value
+        self.commented = commented
+        self.comment = comment
+        self.raw_line = raw_line
+        if raw_line is _unspecified:
             # We parse value only if not already parsed from a file
-            if isinstance(self._value, str):
-                self._value = parse_value(self._value)
+            if isinstance(_value, str):
+                self._value = parse_value(_value)
             # Store the raw_line to track the position in the list of lines.
             self.raw_line = str(self) + "\n"
 
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Entry):
+            return NotImplemented
+        # raw_line is deliberately left out of the comparison.
+        return (
+            self.name == other.name
+            and self._value == other._value
+            and self.commented == other.commented
+            and self.comment == other.comment
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"Entry(name={self.name!r}, _value={self._value!r},"
+            f" commented={self.commented!r}, comment={self.comment!r})"
+        )
+
     @property
     def value(self) -> Value:
         return self._value
@@ -336,13 +439,21 @@ class Entry:
             value = parse_value(value)
         self._value = value
 
+    def clone(self) -> Entry:
+        # Shallow field copy, much cheaper than copy.copy() which goes
+        # through the pickle machinery.
+        entry = object.__new__(Entry)
+        for attr in self.__slots__:
+            setattr(entry, attr, getattr(self, attr))
+        return entry
+
     def serialize(self) -> str:
         return serialize_value(self.value)
 
     def __str__(self) -> str:
-        line = "%(name)s = %(value)s" % dict(name=self.name, value=self.serialize())
+        line = f"{self.name} = {self.serialize()}"
         if self.comment:
-            line += "  # " + self.comment
+            line += f"  # {self.comment}"
         if self.commented:
             line = "#" + line
         return line
@@ -460,12 +571,15 @@ class Configuration:
     lines: list[str]
     entries: dict[str, Entry]
     path: str | None
-
-    _parameter_re = re.compile(
-        r"^(?P<name>[a-z_.]+)(?: +(?!=)| *= *)(?P<value>.*?)"
-        "[\\s\t]*"
-        r"(?P<comment>#.*)?$"
-    )
+    # Maps entry name to its position in 'lines', so that updating an
+    # entry does not require a linear scan of the file.
+    _line_index: dict[str, int]
+    # Subset of 'entries' that is not commented, maintained incrementally
+    # so that as_dict() does not refilter on every call.
+    _active: dict[str, Entry]
+    # False once parsed with keep_lines=False; save() then refuses to
+    # write, as it would drop the original content.
+    _lines_kept: bool
 
     # Internally, lines property contains an updated list of all comments and
     # entries serialized. When adding a setting or updating an existing one,
@@ -476,14 +590,29 @@ class Configuration:
         self.__dict__.update(
             dict(
                 lines=[],
-                entries=OrderedDict(),
+                entries={},
                 path=path,
+                _line_index={},
+                _active={},
+                _lines_kept=True,
             )
         )
 
-    def parse(self, fo: Iterable[str]) -> Iterator[tuple[pathlib.Path, IncludeType]]:
+    def parse(
+        self, fo: Iterable[str], *, keep_lines: bool = True
+    ) -> Iterator[tuple[pathlib.Path, IncludeType]]:
+        if not keep_lines:
+            self._lines_kept = False
+        # Bind hot-loop names to locals, sparing attribute lookups per line.
+        match = _PARAM_MATCH
+        lines = self.lines
+        lines_append = lines.append
+        entries = self.entries
+        active = self._active
+        line_index = self._line_index
         for raw_line in fo:
-            self.lines.append(raw_line)
+            if keep_lines:
+                lines_append(raw_line)
             line = raw_line.strip()
             if not line:
                 continue
@@ -496,21 +625,21 @@ class Configuration:
                 if "=" not in line:
                     continue
                 line = line.lstrip("#").lstrip()
-                m = self._parameter_re.match(line)
+                m = match(line)
                 if not m:
                     # This is a real comment
                     continue
                 commented = True
             else:
-                m = self._parameter_re.match(line)
+                m = match(line)
                 if not m:
                     raise ValueError("Bad line: %r." % raw_line)
             kwargs = m.groupdict()
-            name = kwargs.pop("name")
+            name = sys.intern(kwargs.pop("name"))
             value = parse_value(kwargs.pop("value"))
-            if name in IncludeType.__members__:
+            if name in _INCLUDE_NAMES:
                 if not commented:
-                    include_type = IncludeType[name]
+                    include_type = _INCLUDE_BY_NAME[name]
                     assert isinstance(value, str), type(value)
                     yield (pathlib.Path(value), include_type)
             else:
@@ -520,18 +649,23 @@ class Configuration:
                 if commented:
                     # Only overwrite a previous entry if it is commented.
                     try:
-                        existing_entry = self.entries[name]
+                        existing_entry = entries[name]
                     except KeyError:
                         pass
                     else:
                         if not existing_entry.commented:
                             continue
-                self.entries[name] = Entry(
+                entry = Entry(
                     name, value, commented=commented, raw_line=raw_line, **kwargs
                 )
+                entries[name] = entry
+                if not commented:
+                    active[name] = entry
+                if keep_lines:
+                    line_index[name] = len(lines) - 1
 
     def parse_string(self, string: str) -> None:
-        list(_consume(self, string.splitlines(keepends=True)))
+        _consume(self, string.splitlines(keepends=True))
 
     def __add__(self, other: Any) -> Configuration:
         cls = self.__class__
@@ -540,6 +674,7 @@ class Configuration:
         s = cls()
         s.entries.update(self.entries)
         s.entries.update(other.entries)
+        s._rebuild_active()
         return s
 
     def __iadd__(self, other: Any) -> Configuration:
@@ -547,7 +682,9 @@ class Configuration:
         if not isinstance(other, cls):
             return NotImplemented
         self.lines[:] = []
+        self._line_index.clear()
         self.entries.update(other.entries)
+        self._rebuild_active()
         return self
 
     def __getattr__(self, name: str) -> Value:
@@ -569,7 +706,7 @@ class Configuration:
         return self.entries[key].value
 
     def __setitem__(self, key: str, value: Value) -> None:
-        if key in IncludeType.__members__:
+        if key in _INCLUDE_NAMES:
             raise ValueError("cannot add an include directive")
         if key in self.entries:
             e = self.entries[key]
@@ -584,12 +721,21 @@ class Configuration:
         except KeyError:
             return default
 
+    def _rebuild_active(self) -> None:
+        self._active.clear()
+        for k, e in self.entries.items():
+            if not e.commented:
+                self._active[k] = e
+
     def _add_entry(self, entry: Entry) -> None:
         assert entry.name not in self.entries
         self.entries[entry.name] = entry
+        if not entry.commented:
+            self._active[entry.name] = entry
         # Append serialized line.
         entry.raw_line = str(entry) + "\n"
         self.lines.append(entry.raw_line)
+        self._line_index[entry.name] = len(self.lines) - 1
 
     def _update_entry(self, entry: Entry) -> None:
         key = entry.name
@@ -599,12 +745,17 @@ class Configuration:
             # that setting a value to a commented entry does not make much
             # sense.)
             entry.commented = False
+        if entry.commented:
+            self._active.pop(key, None)
+        else:
+            self._active[key] = entry
         # Update serialized entry.
         old_line = old_entry.raw_line
         entry.raw_line = str(entry) + "\n"
-        try:
-            lineno = self.lines.index(old_line)
-        except ValueError:
+        lineno = self._line_index.get(key)
+        if lineno is None or not (
+            0 <= lineno < len(self.lines) and self.lines[lineno] == old_line
+        ):
             if not entry.commented:
                 msg = (
                     f"entry {key!r} not directly found in {self.path or 'parsed content'}"
@@ -613,14 +764,15 @@ class Configuration:
                 )
                 warn(msg, UserWarning)
                 self.lines.append(entry.raw_line)
+                self._line_index[key] = len(self.lines) - 1
         else:
-            self.lines[lineno : lineno + 1] = [entry.raw_line]
+            self.lines[lineno] = entry.raw_line
 
     def __iter__(self) -> Iterator[Entry]:
         return iter(self.entries.values())
 
     def as_dict(self) -> dict[str, Value]:
-        return {k: v.value for k, v in self.entries.items() if not v.commented}
+        return {k: e._value for k, e in self._active.items()}
 
     @contextlib.contextmanager
     def edit(self) -> Iterator[EntriesProxy]:
@@ -659,7 +811,7 @@ class Configuration:
         port = 2345
         unix_socket_directories = '/var/run/postgresql'  # comma-separated list of directories
         """  # noqa: E501
-        entries = EntriesProxy({k: copy.copy(v) for k, v in self.entries.items()})
+        entries = EntriesProxy({k: v.clone() for k, v in self.entries.items()})
         try:
             yield entries
         except Exception:
@@ -672,12 +824,30 @@ class Configuration:
                     self._add_entry(entry)
                 elif self.entries[k] != entry:
                     self._update_entry(entry)
-            # Discard removed entries.
-            for k, entry in list(self.entries.items()):
-                if k not in entries:
-                    del self.entries[k]
-                    if entry.raw_line is not None:
-                        self.lines.remove(entry.raw_line)
+            # Discard removed entries and their lines in a single pass,
+            # instead of one linear scan per removed key.
+            removed = {
+                e.raw_line
+                for k, e in self.entries.items()
+                if k not in entries and e.raw_line is not None
+            }
+            for k in [k for k in self.entries if k not in entries]:
+                del self.entries[k]
+                self._line_index.pop(k, None)
+                self._active.pop(k, None)
+            if removed:
+                self.lines[:] = [line for line in self.lines if line not in removed]
+                # Line positions shifted; rebuild the index.
+                raw_to_name = {
+                    e.raw_line: n
+                    for n, e in self.entries.items()
+                    if e.raw_line is not None
+                }
+                self._line_index.clear()
+                for i, line in enumerate(self.lines):
+                    name = raw_to_name.get(line)
+                    if name is not None:
+                        self._line_index[name] = i
 
     def save(self, fo: str | pathlib.Path | IO[str] | None = None) -> None:
         """Write configuration to a file.
@@ -686,8 +856,12 @@ class Configuration:
 
         :param fo: A path or file-like object. Required if :attr:`path` is
             None.
+        :raises ValueError: if the configuration was parsed with
+            ``keep_lines=False``, as saving would drop the original content.
 
         """
+        if not self._lines_kept:
+            raise ValueError("cannot save a configuration parsed with keep_lines=False")
         with open_or_return(fo or self.path, mode="w") as fo:
             for line in self.lines:
                 fo.write(line)
@@ -695,7 +869,7 @@ class Configuration:
 
 def _main(argv: list[str]) -> int:  # pragma: nocover
     try:
-        conf = parse(argv[0] if argv else sys.stdin)
+        conf = parse(argv[0] if argv else sys.stdin, keep_lines=False)
         print(json.dumps(conf.as_dict(), cls=JSONDateEncoder, indent=2))
         return 0
     except Exception as e:
@@ -21,6 +21,7 @@ def test_parse_value():
     assert 10 == parse_value("10")
     assert "010" == parse_value("010")
     assert "010" == parse_value("'010'")
+    assert "0777 " == parse_value("0777 ")
     assert 1.4 == parse_value("1.4")
     assert -2 == parse_value("-2")
     assert 0.2 == parse_value("0.2")
@@ -183,6 +184,21 @@ def test_configuration_multiple_entries():
     ]
 
 
+def test_parse_keep_lines(tmp_path: pathlib.Path):
+    from pgtoolkit.conf import parse
+
+    pgconf = tmp_path / "postgres.conf"
+    pgconf.write_text("port = 5432\n#listen_addresses = 'localhost'\n")
+    conf = parse(pgconf)
+    light = parse(pgconf, keep_lines=False)
+    assert light.as_dict() == conf.as_dict()
+    assert light.lines == []
+    assert light._line_index == {}
+    # Saving would drop the original content.
+    with pytest.raises(ValueError, match="keep_lines=False"):
+        light.save()
+
+
 def test_parser_includes_require_an_absolute_file_path():
     from pgtoolkit.conf import ParseError, parse
 